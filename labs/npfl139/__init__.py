@@ -6,6 +6,7 @@
 
 # EvaluationEnv
 from .evaluation_env import EvaluationEnv
+from .evaluation_env import EvaluationVectorEnv
 
 # Custom environments
 from . import envs
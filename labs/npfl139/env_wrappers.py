@@ -6,6 +6,36 @@
 import gymnasium as gym
 import numpy as np
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# The tile coding kernel is compiled by Numba when available; otherwise, NumPy vectorization is used.
+# The kernel is a scalar version of `DiscretizationWrapper._digitize` followed by the tile coding
+# of `DiscretizationWrapper.observation`, and any change of the bin computation (the clamping of
+# the estimate including NaNs, and the boundary corrections) must be kept in sync in both.
+if numba is not None:
+    @numba.njit(cache=True)
+    def _tile_code(observations, lows, steps, bins, edges, edges_offsets, tiles_offsets, tiles_tops, tiles_states):
+        states = np.empty(1 + len(tiles_offsets), dtype=np.int64)
+        for t in range(len(states)):
+            state = 0
+            for i in range(len(observations)):
+                value = observations[i] + (tiles_offsets[t - 1, i] if t else 0.)
+                index = (value - lows[i]) / steps[i] + 1
+                index = bins[i] if not index < bins[i] else int(index) if index > 0 else 0
+                if value < edges[edges_offsets[i] + index]:
+                    index -= 1
+                elif value >= edges[edges_offsets[i] + index + 1]:
+                    index += 1
+                if t and value > tiles_tops[i]:
+                    index = bins[i] + 1
+                state = state * (bins[i] + (2 if t else 1)) + index
+            states[t] = state + (tiles_states[t - 1] if t else 0)
+        return states
+
 
 class DiscretizationWrapper(gym.ObservationWrapper):
     def __init__(self, env, separators, tiles=None):
@@ -13,27 +43,86 @@ class DiscretizationWrapper(gym.ObservationWrapper):
         self._separators = separators
         self._tiles = tiles
 
+        # All our separators are equidistant, so the `np.digitize` can be replaced by a direct computation
+        # of the bin index, which is then corrected by comparing with the neighboring separators (so that
+        # the result is exactly the same even on the bin boundaries). The `np.digitize` is used only
+        # when some of the separators are not uniform.
+        self._lows = np.array([s[0] if len(s) else 0 for s in separators], dtype=np.float64)
+        self._steps = np.array([s[1] - s[0] if len(s) > 1 else 1 for s in separators], dtype=np.float64)
+        self._bins = np.array([len(s) for s in separators], dtype=np.int64)
+        self._uniform = all(np.all(np.diff(s) > 0) and np.allclose(np.diff(s), step, rtol=1e-9, atol=0)
+                            for s, step in zip(separators, self._steps))
+        # The separators are padded by -inf on the left and by NaN on the right, so that any value
+        # (including infinities and NaNs) is placed into the same bin as by `np.digitize`.
+        edges = np.full((len(separators), max(self._bins, default=0) + 2), np.nan)
+        edges[:, 0] = -np.inf
+        for edge, separator in zip(edges, separators):
+            edge[1:1 + len(separator)] = separator
+        self._edges, self._edges_offsets = edges.ravel(), np.arange(len(separators)) * edges.shape[1]
+        self._radix = np.cumprod(np.concatenate([[1], 1 + self._bins[:0:-1]]))[::-1]
+
         if tiles is None:
-            states = 1
-            for separator in separators:
-                states *= 1 + len(separator)
-            self.observation_space = gym.spaces.Discrete(states)
+            self.observation_space = gym.spaces.Discrete(int(np.prod(1 + self._bins)))
         else:
-            self._first_tile_states, self._rest_tiles_states = 1, 1
-            for separator in separators:
-                self._first_tile_states *= 1 + len(separator)
-                self._rest_tiles_states *= 2 + len(separator)
+            self._first_tile_states = int(np.prod(1 + self._bins))
+            self._rest_tiles_states = int(np.prod(2 + self._bins))
             self.observation_space = gym.spaces.MultiDiscrete([
                 self._first_tile_states + i * self._rest_tiles_states for i in range(tiles)])
 
-            self._separator_offsets = [0 if len(s) <= 1 else (s[1] - s[0]) / tiles for s in separators]
-            self._separator_tops = [np.inf if len(s) <= 1 else s[-1] + (s[1] - s[0]) for s in separators]
+            self._separator_offsets = np.where(self._bins > 1, self._steps / tiles, 0)
+            self._separator_tops = np.where(
+                self._bins > 1, edges[np.arange(len(separators)), self._bins] + self._steps, np.inf)
+
+            # Precomputed offsets, radix weights and initial states of the tiles other than the first one.
+            self._tiles_offsets = ((np.arange(1, tiles)[:, np.newaxis] * (2 * np.arange(len(separators)) + 1))
+                                   % tiles) * self._separator_offsets
+            self._tiles_radix = np.cumprod(np.concatenate([[1], 2 + self._bins[:0:-1]]))[::-1]
+            self._tiles_states = self._first_tile_states + np.arange(tiles - 1) * self._rest_tiles_states
+
+    def _digitize(self, values):
+        # The `np.fmin` maps NaNs to the last bin, just like `np.digitize` does.
+        bins = np.maximum(np.fmin((values - self._lows) / self._steps + 1, self._bins), 0).astype(np.int64)
+        bins -= values < self._edges[self._edges_offsets + bins]
+        bins += values >= self._edges[self._edges_offsets + bins + 1]
+        return bins
 
     def observation(self, observations):
-        state = 0
-        for observation, separator in zip(observations, self._separators):
-            state *= 1 + len(separator)
-            state += np.digitize(observation, separator)
+        if not self._uniform:
+            return self._observation_digitize(observations)
+
+        observations = np.asarray(observations, dtype=np.float64)
+        if self._tiles is not None and numba is not None:
+            return _tile_code(observations, self._lows, self._steps, self._bins, self._edges, self._edges_offsets,
+                              self._tiles_offsets, self._separator_tops, self._tiles_states)
+
+        state = int(self._digitize(observations) @ self._radix)
+        if self._tiles is None:
+            return state
+        else:
+            states = np.empty(self._tiles, dtype=np.int64)
+            states[0] = state
+            values = observations + self._tiles_offsets
+            bins = self._digitize(values) + (values > self._separator_tops)
+            states[1:] = self._tiles_states + bins @ self._tiles_radix
+            return states
+
+    def observation_batch(self, observations):
+        """Discretize a batch of observations, returning an array of shape `(N,)` or `(N, tiles)`."""
+        if not self._uniform:
+            return np.array([self._observation_digitize(observation) for observation in observations])
+
+        observations = np.asarray(observations, dtype=np.float64)
+        states = self._digitize(observations) @ self._radix
+        if self._tiles is None:
+            return states
+        else:
+            values = observations[:, np.newaxis] + self._tiles_offsets
+            bins = self._digitize(values) + (values > self._separator_tops)
+            return np.concatenate([states[:, np.newaxis], self._tiles_states + bins @ self._tiles_radix], axis=1)
+
+    def _observation_digitize(self, observations):
+        state = int(np.dot([np.digitize(observation, separator)
+                            for observation, separator in zip(observations, self._separators)], self._radix))
         if self._tiles is None:
             return state
         else:
@@ -42,10 +131,10 @@ class DiscretizationWrapper(gym.ObservationWrapper):
             for t in range(1, self._tiles):
                 state = 0
                 for i in range(len(self._separators)):
-                    state *= 2 + len(self._separators[i])
+                    state *= 2 + self._bins[i]
                     value = observations[i] + ((t * (2 * i + 1)) % self._tiles) * self._separator_offsets[i]
                     if value > self._separator_tops[i]:
-                        state += 1 + len(self._separators[i])
+                        state += 1 + self._bins[i]
                     else:
                         state += np.digitize(value, self._separators[i])
                 states[t] = self._first_tile_states + (t - 1) * self._rest_tiles_states + state
@@ -89,15 +178,18 @@ class DiscreteLunarLanderWrapper(DiscretizationWrapper):
         gym.Env.reset(self._expert.unwrapped, seed=42)
 
     def expert_trajectory(self, seed=None):
-        state, trajectory, done = self._expert.reset(seed=seed)[0], [], False
+        # The raw states are collected first and then discretized all at once.
+        states, actions, rewards, done = [self._expert.reset(seed=seed)[0]], [], [], False
         while not done:
-            action = gym.envs.box2d.lunar_lander.heuristic(self._expert, state)
-            next_state, reward, terminated, truncated, _ = self._expert.step(action)
-            trajectory.append((self.observation(state), action, reward))
+            action = gym.envs.box2d.lunar_lander.heuristic(self._expert, states[-1])
+            state, reward, terminated, truncated, _ = self._expert.step(action)
+            states.append(state)
+            actions.append(action)
+            rewards.append(reward)
             done = terminated or truncated
-            state = next_state
-        trajectory.append((self.observation(state), None, None))
-        return trajectory
+        actions.append(None)
+        rewards.append(None)
+        return list(zip(self.observation_batch(np.stack(states)).tolist(), actions, rewards))
 
 
 gym.envs.register(
@@ -3,6 +3,7 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import collections
 import os
 import sys
 
@@ -10,13 +11,42 @@ import gymnasium as gym
 import numpy as np
 
 
+class _EpisodeReturns:
+    """The episode returns, with periodic reports of the mean return of the last `evaluate_for` episodes."""
+    def __init__(self, evaluate_for, report_each):
+        self._evaluate_for = evaluate_for
+        self._report_each = report_each
+        self._report_verbose = os.getenv("VERBOSE", "1") not in ["", "0"]
+
+        self._returns = []
+        self._recent_returns = collections.deque(maxlen=evaluate_for)
+
+    def __len__(self):
+        return len(self._returns)
+
+    def mean_std(self):
+        # The mean and standard deviation of the last `evaluate_for` returns (of all returns when it is 0).
+        returns = np.array(self._recent_returns if self._evaluate_for else self._returns)
+        return returns.mean(), returns.std()
+
+    def append(self, episode_return):
+        self._returns.append(episode_return)
+        self._recent_returns.append(episode_return)
+
+        if self._report_each and len(self._returns) % self._report_each == 0:
+            mean, std = self.mean_std()
+            report = f"Episode {len(self._returns)}, mean {self._evaluate_for}-episode return {mean:.2f} +-{std:.2f}"
+            if self._report_verbose:
+                report += ", returns " + " ".join(f"{r:g}" for r in self._returns[-self._report_each:])
+            sys.stderr.write(report + "\n")
+            sys.stderr.flush()
+
+
 class EvaluationEnv(gym.Wrapper):
     def __init__(self, env, seed=None, render_each=0, evaluate_for=100, report_each=10):
         super().__init__(env)
         self._render_each = render_each
         self._evaluate_for = evaluate_for
-        self._report_each = report_each
-        self._report_verbose = os.getenv("VERBOSE", "1") not in ["", "0"]
 
         gym.Env.reset(self.unwrapped, seed=seed)
         self.action_space.seed(seed)
@@ -28,15 +58,21 @@ class EvaluationEnv(gym.Wrapper):
                 setattr(self, passthrough, getattr(env.unwrapped, passthrough))
 
         self._episode_running = False
-        self._episode_returns = []
+        self._episode_returns = _EpisodeReturns(evaluate_for, report_each)
         self._evaluating_from = None
         self._original_render_mode = env.render_mode
         self._pygame = __import__("pygame") if self._render_each else None
+        self._render_mode = env.render_mode
 
     @property
     def episode(self):
         return len(self._episode_returns)
 
+    @staticmethod
+    def wrap_vector(env_fn, num_envs, seed=None, evaluate_for=100, report_each=10):
+        """Create a `gym.vector.SyncVectorEnv` of `num_envs` environments wrapped in `EvaluationVectorEnv`."""
+        return EvaluationVectorEnv(gym.vector.SyncVectorEnv([env_fn] * num_envs), seed, evaluate_for, report_each)
+
     def reset(self, *, start_evaluation=False, logging=True, seed=None, options=None):
         if seed is not None:
             raise RuntimeError("The EvaluationEnv cannot be reseeded")
@@ -45,10 +81,12 @@ class EvaluationEnv(gym.Wrapper):
         if start_evaluation and self._evaluating_from is None:
             self._evaluating_from = self.episode
 
-        if logging and self._render_each and (self.episode + 1) % self._render_each == 0:
-            self.unwrapped.render_mode = "human"
-        elif self._render_each:
-            self.unwrapped.render_mode = self._original_render_mode
+        if self._render_each:
+            render_mode = self._original_render_mode
+            if logging and (self.episode + 1) % self._render_each == 0:
+                render_mode = "human"
+            if render_mode != self._render_mode:
+                self.unwrapped.render_mode = self._render_mode = render_mode
         self._episode_running = True
         self._episode_return = 0 if logging or self._evaluating_from is not None else None
         return super().reset(options=options)
@@ -65,22 +103,90 @@ class EvaluationEnv(gym.Wrapper):
             self._episode_return += reward
         if self._episode_return is not None and done:
             self._episode_returns.append(self._episode_return)
-
-            if self._report_each and self.episode % self._report_each == 0:
-                print("Episode {}, mean {}-episode return {:.2f} +-{:.2f}{}".format(
-                    self.episode, self._evaluate_for, np.mean(self._episode_returns[-self._evaluate_for:]),
-                    np.std(self._episode_returns[-self._evaluate_for:]), "" if not self._report_verbose else
-                    ", returns " + " ".join(map("{:g}".format, self._episode_returns[-self._report_each:]))),
-                    file=sys.stderr, flush=True)
             if self._evaluating_from is not None and self.episode >= self._evaluating_from + self._evaluate_for:
                 print("The mean {}-episode return after evaluation {:.2f} +-{:.2f}".format(
-                    self._evaluate_for, np.mean(self._episode_returns[-self._evaluate_for:]),
-                    np.std(self._episode_returns[-self._evaluate_for:])), flush=True)
+                    self._evaluate_for, *self._episode_returns.mean_std()), flush=True)
                 self.close()
                 sys.exit(0)
 
-        if self._pygame and self.unwrapped.render_mode == "human" and self._pygame.get_init():
+        # The `_render_mode` mirrors the render mode of the unwrapped environment, so it need not be queried.
+        if self._pygame and self._render_mode == "human" and self._pygame.get_init():
             if self._pygame.event.get(self._pygame.QUIT):
-                self.unwrapped.render_mode = self._original_render_mode
+                self.unwrapped.render_mode = self._render_mode = self._original_render_mode
 
         return observation, reward, terminated, truncated, info
+
+
+class EvaluationVectorEnv(gym.vector.VectorWrapper):
+    """Vector environment wrapper reporting and evaluating the returns of the episodes of all its environments.
+
+    Every finished episode of any of the environments is counted as a single episode,
+    and the mean returns are periodically reported just like in `EvaluationEnv`.
+    The returns of the episodes finished in a step are also passed in the `infos`
+    as `episode_return`, together with the usual `_episode_return` mask.
+
+    After `reset(start_evaluation=True)`, which must reset all environments, the
+    first `evaluate_for` finished episodes are evaluated, and the program exits
+    after printing their mean return, as in `EvaluationEnv`; episodes which are
+    still running cannot be reset during the evaluation.
+
+    The wrapped environment must be a `gym.vector.SyncVectorEnv`. Both the next-step
+    and same-step autoreset modes are supported; rendering is not.
+    """
+    def __init__(self, env, seed=None, evaluate_for=100, report_each=10):
+        super().__init__(env)
+        if not isinstance(env.unwrapped, gym.vector.SyncVectorEnv):
+            raise ValueError("The EvaluationVectorEnv requires a gym.vector.SyncVectorEnv")
+        self._evaluate_for = evaluate_for
+
+        # Seed the environments like `gym.vector.SyncVectorEnv.reset(seed=seed)` would, but without resetting them.
+        for i, sub_env in enumerate(env.unwrapped.envs):
+            gym.Env.reset(sub_env.unwrapped, seed=None if seed is None else seed + i)
+        self.action_space.seed(seed)
+        self.observation_space.seed(seed)
+
+        self._episode_returns = _EpisodeReturns(evaluate_for, report_each)
+        self._episode_return_vec = np.zeros(self.num_envs)
+        self._episode_running = np.zeros(self.num_envs, dtype=bool)
+        self._evaluating_from = None
+
+    @property
+    def episode(self):
+        return len(self._episode_returns)
+
+    def reset(self, *, start_evaluation=False, seed=None, options=None):
+        if seed is not None:
+            raise RuntimeError("The EvaluationVectorEnv cannot be reseeded")
+        reset_mask = np.ones(self.num_envs, dtype=bool)
+        if options is not None and "reset_mask" in options:
+            reset_mask = np.asarray(options["reset_mask"], dtype=bool)
+        if self._evaluating_from is not None and np.any(self._episode_running & reset_mask):
+            raise RuntimeError("Cannot reset a running episode after `start_evaluation=True`")
+        if start_evaluation and self._evaluating_from is None:
+            if not np.all(reset_mask):
+                raise RuntimeError("The `start_evaluation=True` requires resetting all environments")
+            self._evaluating_from = self.episode
+
+        self._episode_running |= reset_mask
+        self._episode_return_vec[reset_mask] = 0
+        return super().reset(options=options)
+
+    def step(self, actions):
+        observations, rewards, terminated, truncated, infos = super().step(actions)
+        dones = terminated | truncated
+        self._episode_running = ~dones
+
+        # In the next-step autoreset mode, the rewards of the resetting steps are zeros.
+        self._episode_return_vec += rewards
+        for episode_return in self._episode_return_vec[dones].tolist():
+            self._episode_returns.append(episode_return)
+        infos = {**infos, "episode_return": np.where(dones, self._episode_return_vec, 0), "_episode_return": dones}
+        self._episode_return_vec[dones] = 0
+
+        if self._evaluating_from is not None and self.episode >= self._evaluating_from + self._evaluate_for:
+            print("The mean {}-episode return after evaluation {:.2f} +-{:.2f}".format(
+                self._evaluate_for, *self._episode_returns.mean_std()), flush=True)
+            self.close()
+            sys.exit(0)
+
+        return observations, rewards, terminated, truncated, infos
@@ -6,51 +6,129 @@
 import numpy as np
 
 # We use a custom implementation instead of `collections.deque`, which has
-# linear complexity of indexing (it is a two-way linked list). The following
-# implementation has similar runtime performance as a numpy array of objects,
-# but it has unnecessary memory overhead (hundreds of MBs for 1M elements).
+# linear complexity of indexing (it is a two-way linked list). The items are
+# stored in a list when the capacity is unlimited, and in a preallocated numpy
+# array of objects otherwise, so that sampling is a single fancy-index gather.
+# Both have unnecessary memory overhead (hundreds of MBs for 1M elements).
 # Using five numpy arrays (for state, action, reward, done, and next state)
-# would provide minimal memory overhead, but it is not so flexible.
+# provides minimal memory overhead, but it is not so flexible; therefore, it
+# is used only when the `specs` of the individual item fields are given.
 class ReplayBuffer:
-    """Simple replay buffer with possibly limited capacity."""
-    def __init__(self, max_length=None):
+    """Simple replay buffer with possibly limited capacity.
+
+    If `specs` are given, they must be a dictionary mapping the item field names
+    to `(shape, dtype)` pairs. The items (named tuples or dictionaries) are then
+    stored in preallocated NumPy arrays, one per field, which requires `max_length`
+    to be set. In that case, `sample` returns a single item of the same type,
+    whose fields are NumPy arrays of the sampled values.
+    """
+    def __init__(self, max_length=None, specs=None):
+        if specs is not None and max_length is None:
+            raise ValueError("The ReplayBuffer with `specs` requires `max_length` to be set")
         self._max_length = max_length
-        self._data = []
+        self._specs = specs
+        self._data = np.empty(max_length, dtype=object) if max_length is not None and specs is None else []
+        self._size = 0
         self._offset = 0
 
+        self._arrays = None
+        self._item_type = None
+
     def __len__(self):
-        return len(self._data)
+        return len(self._data) if self._max_length is None else self._size
 
     @property
     def max_length(self):
         return self._max_length
 
+    def _next_index(self):
+        if self._size < self._max_length:
+            self._size += 1
+            return self._size - 1
+        index, self._offset = self._offset, (self._offset + 1) % self._max_length
+        return index
+
+    def _allocate_arrays(self, item):
+        self._arrays = {key: np.empty((self._max_length, *shape), dtype)
+                        for key, (shape, dtype) in self._specs.items()}
+        self._item_type = type(item)
+
     def append(self, item):
-        if self._max_length is not None and len(self._data) >= self._max_length:
+        # The common case of a full buffer of objects is handled first and without any method calls.
+        if self._size == self._max_length and self._specs is None:
             self._data[self._offset] = item
             self._offset = (self._offset + 1) % self._max_length
-        else:
+        elif self._max_length is None:
             self._data.append(item)
+        elif self._specs is None:
+            self._data[self._size] = item
+            self._size += 1
+        else:
+            if self._arrays is None:
+                self._allocate_arrays(item)
+            index = self._next_index()
+            for key, array in self._arrays.items():
+                array[index] = item[key] if isinstance(item, dict) else getattr(item, key)
+
+    def _store(self, start, items):
+        # Store the given items to the contiguous range of positions starting at `start`.
+        if self._specs is None:
+            self._data[start:start + len(items)] = np.fromiter(items, dtype=object, count=len(items))
+        else:
+            if self._arrays is None:
+                self._allocate_arrays(items[0])
+            for key, array in self._arrays.items():
+                array[start:start + len(items)] = [
+                    item[key] if isinstance(item, dict) else getattr(item, key) for item in items]
 
     def extend(self, items):
         if self._max_length is None:
             self._data.extend(items)
-        else:
-            for item in items:
-                if len(self._data) >= self._max_length:
-                    self._data[self._offset] = item
-                    self._offset = (self._offset + 1) % self._max_length
-                else:
-                    self._data.append(item)
+            return
+
+        # The items are stored using at most three contiguous slice assignments: first filling
+        # the free space, and then overwriting the oldest items, possibly wrapping around.
+        items = list(items)
+        filled = min(len(items), self._max_length - self._size)
+        if filled:
+            self._store(self._size, items[:filled])
+            self._size += filled
+            items = items[filled:]
+        if len(items) > self._max_length:
+            self._offset = (self._offset + len(items) - self._max_length) % self._max_length
+            items = items[len(items) - self._max_length:]
+        if items:
+            first = min(len(items), self._max_length - self._offset)
+            self._store(self._offset, items[:first])
+            if first < len(items):
+                self._store(0, items[first:])
+            self._offset = (self._offset + len(items)) % self._max_length
+
+    def _gather(self, indices):
+        fields = {key: array[indices] for key, array in self._arrays.items()}
+        return fields if issubclass(self._item_type, dict) else self._item_type(**fields)
 
     def __getitem__(self, index):
-        assert -len(self._data) <= index < len(self._data)
-        return self._data[(self._offset + index) % len(self._data)]
+        assert -len(self) <= index < len(self)
+        if self._max_length is None:
+            return self._data[index]
+        index = (self._offset + index) % self._size
+        return self._data[index] if self._specs is None else self._gather(index)
 
     def sample(self, size, generator=np.random, replace=True):
         # By default, the same element can be sampled multiple times. Making sure the samples
         # are unique is costly, and we do not mind the duplicites much during training.
+        # Both the legacy `np.random`/`np.random.RandomState` and `np.random.Generator` are supported.
         if replace:
-            return [self._data[index] for index in generator.randint(len(self._data), size=size)]
+            if hasattr(generator, "integers"):
+                indices = generator.integers(len(self), size=size)
+            else:
+                indices = generator.randint(len(self), size=size)
+        else:
+            indices = generator.choice(len(self), size=size, replace=False)
+        if self._max_length is None:
+            return [self._data[index] for index in indices.tolist()]
+        elif self._specs is None:
+            return list(self._data[indices])
         else:
-            return [self._data[index] for index in generator.choice(len(self._data), size=size, replace=False)]
+            return self._gather(indices)
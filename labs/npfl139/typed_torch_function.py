@@ -3,16 +3,44 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import functools
+
 import numpy as np
 import torch
 
 
+@functools.singledispatch
+def _structural_map(value):
+    return value
+
+
+@_structural_map.register
+def _(value: torch.Tensor):
+    return value.numpy(force=True)
+
+
+@_structural_map.register
+def _(value: tuple):
+    return tuple(_structural_map(element) for element in value)
+
+
+@_structural_map.register
+def _(value: list):
+    return [_structural_map(element) for element in value]
+
+
+@_structural_map.register
+def _(value: dict):
+    return {key: _structural_map(element) for key, element in value.items()}
+
+
 def typed_torch_function(device, *types, via_np=False):
     """Typed Torch function decorator.
 
     The positional input arguments are converted to torch Tensors of the given
     types and on the given device; for NumPy arrays on the same device,
-    the conversion should not copy the data.
+    the conversion should not copy the data. Torch Tensors of the given types
+    and on the given device are passed unchanged.
 
     The torch Tensors generated by the wrapped function are converted back
     to Numpy arrays before returning (while keeping original tuples, lists,
@@ -25,16 +53,11 @@ def typed_torch_function(device, *types, via_np=False):
             raise AssertionError("The typed_torch_function decorator for {} expected {} arguments, but got {}".format(
                 wrapped, len(types), len(args)))
 
-    def structural_map(value):
-        if isinstance(value, torch.Tensor):
-            return value.numpy(force=True)
-        if isinstance(value, tuple):
-            return tuple(structural_map(element) for element in value)
-        if isinstance(value, list):
-            return [structural_map(element) for element in value]
-        if isinstance(value, dict):
-            return {key: structural_map(element) for key, element in value.items()}
-        return value
+    def convert(arg, typ):
+        if isinstance(arg, torch.Tensor):
+            # Tensors are never converted through NumPy; they are returned as-is when already matching.
+            return arg.to(device=device, dtype=typ)
+        return torch.as_tensor(np.asarray(arg) if via_np else arg, dtype=typ, device=device)
 
     class TypedTorchFunctionWrapper:
         def __init__(self, func):
@@ -42,9 +65,7 @@ def typed_torch_function(device, *types, via_np=False):
 
         def __call__(self, *args, **kwargs):
             check_typed_torch_function(self.__wrapped__, args)
-            return structural_map(self.__wrapped__(
-                *[torch.as_tensor(np.asarray(arg) if via_np else arg, dtype=typ, device=device)
-                  for arg, typ in zip(args, types)], **kwargs))
+            return _structural_map(self.__wrapped__(*[convert(arg, typ) for arg, typ in zip(args, types)], **kwargs))
 
         def __get__(self, instance, cls):
             return TypedTorchFunctionWrapper(self.__wrapped__.__get__(instance, cls))